@@ -0,0 +1,157 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, List
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class BackupResult:
+    path: str
+    size: int
+    duration: float
+    pages: int
+
+class BackupError(Exception):
+    pass
+
+class BackupManager:
+    def __init__(self, db_path: str, backup_dir: str = "backups", keep: int = 7,
+                 interval: float = 6 * 3600, pages_per_step: int = 64):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.interval = interval
+        self.pages_per_step = pages_per_step
+        self.prefix = os.path.splitext(os.path.basename(db_path))[0] + "-"
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _check_integrity(path: str):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            conn.close()
+        if result != "ok":
+            raise BackupError(f"Integrity check failed for {path}: {result}")
+
+    def _backup(self, suffix: str = "") -> BackupResult:
+        os.makedirs(self.backup_dir, exist_ok=True)
+        name = f"{self.prefix}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{suffix}.db"
+        path = os.path.join(self.backup_dir, name)
+        tmp_path = path + ".tmp"
+        if os.path.exists(path):
+            raise BackupError(f"Backup {name} already exists")
+        pages = 0
+
+        def progress(status, remaining, total):
+            nonlocal pages
+            pages = total
+
+        # Runs in a worker thread; copying in small page steps releases the
+        # source read lock between steps so writers are never blocked for long.
+        started = time.monotonic()
+        try:
+            src = sqlite3.connect(self.db_path)
+            try:
+                dst = sqlite3.connect(tmp_path)
+                try:
+                    src.backup(dst, pages=self.pages_per_step, progress=progress)
+                finally:
+                    dst.close()
+            finally:
+                src.close()
+            self._check_integrity(tmp_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+
+        return BackupResult(path, os.path.getsize(path), time.monotonic() - started, pages)
+
+    def list_backups(self) -> List[str]:
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = [
+            name for name in os.listdir(self.backup_dir)
+            if name.startswith(self.prefix) and name.endswith(".db")
+        ]
+        return sorted(names, reverse=True)
+
+    def _rotate(self):
+        for name in self.list_backups()[self.keep:]:
+            os.remove(os.path.join(self.backup_dir, name))
+            logger.info(f"Removed old backup {name}")
+
+    async def create_backup(self) -> BackupResult:
+        async with self._lock:
+            result = await asyncio.to_thread(self._backup)
+            await asyncio.to_thread(self._rotate)
+        logger.info(
+            f"Backup {result.path} created: {result.size} bytes, "
+            f"{result.pages} pages in {result.duration:.2f}s"
+        )
+        return result
+
+    def _restore(self, name: str) -> BackupResult:
+        if os.path.basename(name) != name or name not in self.list_backups():
+            raise BackupError(f"Backup {name} not found")
+
+        path = os.path.join(self.backup_dir, name)
+        self._check_integrity(path)
+
+        started = time.monotonic()
+        src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            dst = sqlite3.connect(self.db_path)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+
+        migrate(self.db_path)
+        return BackupResult(path, os.path.getsize(path), time.monotonic() - started, 0)
+
+    async def restore(self, name: str) -> BackupResult:
+        async with self._lock:
+            safety = await asyncio.to_thread(self._backup, "-prerestore")
+            logger.info(f"Saved current database to {safety.path} before restore")
+            result = await asyncio.to_thread(self._restore, name)
+        logger.info(f"Database restored from {result.path} in {result.duration:.2f}s")
+        return result
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.create_backup()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled backup failed: {e}")
+
+    def start(self):
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Backup job started, every {self.interval}s into {self.backup_dir}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
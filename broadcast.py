@@ -0,0 +1,139 @@
+import time
+import asyncio
+import logging
+from typing import Optional, Dict
+from telegram.error import RetryAfter, Forbidden, BadRequest
+from database import Database
+from ratelimit import AsyncRateLimiter
+
+logger = logging.getLogger(__name__)
+
+class Broadcaster:
+    def __init__(self, db: Database, limiter: AsyncRateLimiter, concurrency: int = 10,
+                 page_size: int = 200, report_interval: float = 10.0, max_retries: int = 3):
+        self.db = db
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.report_interval = report_interval
+        self.max_retries = max_retries
+        self.tasks: Dict[int, asyncio.Task] = {}
+
+    async def _send(self, bot, broadcast_id: int, user_id: int, text: str) -> bool:
+        for attempt in range(self.max_retries):
+            await self.limiter.acquire()
+            try:
+                await bot.send_message(chat_id=user_id, text=text)
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"Broadcast #{broadcast_id}: flood limit hit, pausing all sends for {retry_after}s")
+                self.limiter.pause(retry_after)
+            except (Forbidden, BadRequest):
+                return False
+            except Exception as e:
+                logger.error(f"Broadcast #{broadcast_id}: failed to send to {user_id}: {e}")
+                await asyncio.sleep(2 ** attempt)
+        return False
+
+    async def _deliver(self, bot, semaphore: asyncio.Semaphore, broadcast_id: int, user_id: int, text: str) -> bool:
+        async with semaphore:
+            delivered = await self._send(bot, broadcast_id, user_id, text)
+        self.db.record_broadcast_delivery(broadcast_id, user_id, delivered)
+        return delivered
+
+    async def _report(self, bot, chat_id: int, message_id: Optional[int], text: str) -> Optional[int]:
+        try:
+            if message_id is None:
+                message = await bot.send_message(chat_id=chat_id, text=text)
+                return message.message_id
+            await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+        except Exception as e:
+            logger.warning(f"Failed to report broadcast progress: {e}")
+        return message_id
+
+    def _progress_text(self, broadcast_id: int, title: str, sent: int, failed: int, rate: float) -> str:
+        return (
+            f"📣 Рассылка #{broadcast_id}: {title}\n\n"
+            f"Отправлено: {sent}\n"
+            f"Ошибок: {failed}\n"
+            f"Скорость: {rate:.1f} сообщ./с"
+        )
+
+    async def run(self, bot, broadcast_id: int):
+        broadcast = self.db.get_broadcast(broadcast_id)
+        if broadcast is None or broadcast.status != 'running':
+            return
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.monotonic()
+        sent = broadcast.sent
+        failed = broadcast.failed
+        sent_this_run = 0
+        last_user_id = broadcast.last_user_id
+        last_report = started
+        report_id = await self._report(bot, broadcast.created_by, None,
+                                       self._progress_text(broadcast_id, "выполняется", sent, failed, 0.0))
+
+        while True:
+            user_ids = self.db.get_broadcast_recipients(broadcast_id, last_user_id, self.page_size)
+            if not user_ids:
+                break
+
+            results = await asyncio.gather(*(
+                self._deliver(bot, semaphore, broadcast_id, user_id, broadcast.text) for user_id in user_ids
+            ))
+            delivered = sum(results)
+            sent += delivered
+            sent_this_run += delivered
+            failed += len(results) - delivered
+
+            last_user_id = user_ids[-1]
+            self.db.advance_broadcast_cursor(broadcast_id, last_user_id)
+
+            now = time.monotonic()
+            if now - last_report >= self.report_interval:
+                last_report = now
+                rate = sent_this_run / (now - started)
+                report_id = await self._report(bot, broadcast.created_by, report_id,
+                                               self._progress_text(broadcast_id, "выполняется", sent, failed, rate))
+
+        self.db.finish_broadcast(broadcast_id)
+        elapsed = time.monotonic() - started
+        rate = sent_this_run / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Broadcast #{broadcast_id} completed: {sent} sent, {failed} failed, {rate:.1f} msg/s")
+        await self._report(bot, broadcast.created_by, report_id,
+                           self._progress_text(broadcast_id, "завершена ✅", sent, failed, rate))
+
+    def start(self, bot, broadcast_id: int):
+        if broadcast_id in self.tasks:
+            return
+        task = asyncio.get_running_loop().create_task(self.run(bot, broadcast_id))
+        self.tasks[broadcast_id] = task
+        task.add_done_callback(lambda t: self._on_done(broadcast_id, t))
+
+    def _on_done(self, broadcast_id: int, task: asyncio.Task):
+        if self.tasks.get(broadcast_id) is task:
+            del self.tasks[broadcast_id]
+        if not task.cancelled() and task.exception():
+            logger.error(f"Broadcast #{broadcast_id} stopped with error: {task.exception()}")
+
+    def resume_all(self, bot):
+        for broadcast in self.db.get_running_broadcasts():
+            logger.info(f"Resuming broadcast #{broadcast.broadcast_id} after user {broadcast.last_user_id}")
+            self.start(bot, broadcast.broadcast_id)
+
+    def cancel(self, broadcast_id: int) -> bool:
+        if not self.db.finish_broadcast(broadcast_id, 'cancelled'):
+            return False
+        task = self.tasks.get(broadcast_id)
+        if task:
+            task.cancel()
+        return True
+
+    async def stop(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
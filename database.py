@@ -1,11 +1,20 @@
 import sqlite3
 import logging
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict
+from migrations import migrate
+from models import User, Deal, AwaitingDeal, Broadcast, columns, row_factory
 
 logger = logging.getLogger(__name__)
 
+USER_COLUMNS = columns(User)
+DEAL_COLUMNS = columns(Deal)
+AWAITING_DEAL_COLUMNS = columns(AwaitingDeal)
+BROADCAST_COLUMNS = columns(Broadcast)
+
 class Database:
+    MAX_QUERY_PARAMS = 500
+    
     def __init__(self, db_path: str = "ninja_otc.db"):
         self.db_path = db_path
         self.init_db()
@@ -14,68 +23,33 @@ class Database:
         return sqlite3.connect(self.db_path)
     
     def init_db(self):
+        version = migrate(self.db_path)
+        logger.info(f"Database ready (schema version {version})")
+    
+    def get_user(self, user_id: int) -> Optional[User]:
         conn = self.get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                ton_wallet TEXT,
-                bank_card TEXT,
-                successful_deals INTEGER DEFAULT 0,
-                role TEXT DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS deals (
-                deal_id TEXT PRIMARY KEY,
-                seller_id INTEGER NOT NULL,
-                buyer_id INTEGER,
-                amount TEXT NOT NULL,
-                description TEXT NOT NULL,
-                payment_type TEXT NOT NULL,
-                payment_address TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP,
-                FOREIGN KEY (seller_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admins (
-                user_id INTEGER PRIMARY KEY,
-                added_by INTEGER NOT NULL,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        conn.commit()
+        cursor.row_factory = row_factory(User)
+        cursor.execute(f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ?", (user_id,))
+        user = cursor.fetchone()
         conn.close()
-        logger.info("Database initialized successfully")
+        return user
     
-    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+    def get_users(self, user_ids: List[int]) -> Dict[int, User]:
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        conn.close()
+        cursor.row_factory = row_factory(User)
+        users = {}
         
-        if row:
-            return {
-                'user_id': row[0],
-                'username': row[1],
-                'ton_wallet': row[2],
-                'bank_card': row[3],
-                'successful_deals': row[4],
-                'role': row[5],
-                'created_at': row[6]
-            }
-        return None
+        for i in range(0, len(user_ids), self.MAX_QUERY_PARAMS):
+            chunk = user_ids[i:i + self.MAX_QUERY_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"SELECT {USER_COLUMNS} FROM users WHERE user_id IN ({placeholders})", chunk)
+            for user in cursor.fetchall():
+                users[user.user_id] = user
+        
+        conn.close()
+        return users
     
     def create_or_update_user(self, user_id: int, username: Optional[str] = None):
         conn = self.get_connection()
@@ -88,6 +62,36 @@ class Database:
         conn.commit()
         conn.close()
     
+    def create_user_with_referral(self, user_id: int, username: Optional[str], referrer_id: int) -> bool:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
+        if cursor.fetchone():
+            cursor.execute("UPDATE users SET username = ? WHERE user_id = ?", (username, user_id))
+            conn.commit()
+            conn.close()
+            return False
+        
+        cursor.execute("INSERT INTO users (user_id, username) VALUES (?, ?)", (user_id, username))
+        
+        recorded = False
+        if referrer_id != user_id:
+            cursor.execute(
+                "UPDATE users SET referral_count = referral_count + 1 WHERE user_id = ?",
+                (referrer_id,)
+            )
+            if cursor.rowcount > 0:
+                cursor.execute(
+                    "INSERT INTO referrals (referee_id, referrer_id) VALUES (?, ?)",
+                    (user_id, referrer_id)
+                )
+                recorded = True
+        
+        conn.commit()
+        conn.close()
+        return recorded
+    
     def update_user_payment_details(self, user_id: int, ton_wallet: Optional[str] = None, bank_card: Optional[str] = None):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -161,27 +165,30 @@ class Database:
         except sqlite3.IntegrityError:
             return False
     
-    def get_deal(self, deal_id: str) -> Optional[Dict[str, Any]]:
+    def get_deal(self, deal_id: str) -> Optional[Deal]:
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM deals WHERE deal_id = ?", (deal_id,))
-        row = cursor.fetchone()
+        cursor.row_factory = row_factory(Deal)
+        cursor.execute(f"SELECT {DEAL_COLUMNS} FROM deals WHERE deal_id = ?", (deal_id,))
+        deal = cursor.fetchone()
         conn.close()
+        return deal
+    
+    def get_deals(self, deal_ids: List[str]) -> Dict[str, Deal]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(Deal)
+        deals = {}
         
-        if row:
-            return {
-                'deal_id': row[0],
-                'seller_id': row[1],
-                'buyer_id': row[2],
-                'amount': row[3],
-                'description': row[4],
-                'payment_type': row[5],
-                'payment_address': row[6],
-                'status': row[7],
-                'created_at': row[8],
-                'completed_at': row[9]
-            }
-        return None
+        for i in range(0, len(deal_ids), self.MAX_QUERY_PARAMS):
+            chunk = deal_ids[i:i + self.MAX_QUERY_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"SELECT {DEAL_COLUMNS} FROM deals WHERE deal_id IN ({placeholders})", chunk)
+            for deal in cursor.fetchall():
+                deals[deal.deal_id] = deal
+        
+        conn.close()
+        return deals
     
     def set_deal_buyer(self, deal_id: str, buyer_id: int) -> bool:
         conn = self.get_connection()
@@ -191,58 +198,106 @@ class Database:
         conn.close()
         return True
     
-    def confirm_payment(self, deal_id: str) -> bool:
+    def get_feed_cursor(self, feed: str):
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE deals SET status = 'payment_confirmed' WHERE deal_id = ?", (deal_id,))
+        cursor.execute("SELECT cursor FROM payment_feed_state WHERE feed = ?", (feed,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+    
+    @staticmethod
+    def _save_feed_cursor(cursor, feed: str, feed_cursor):
+        cursor.execute("""
+            INSERT INTO payment_feed_state (feed, cursor) VALUES (?, ?)
+            ON CONFLICT(feed) DO UPDATE SET cursor = excluded.cursor, updated_at = CURRENT_TIMESTAMP
+        """, (feed, feed_cursor))
+    
+    def save_feed_cursor(self, feed: str, feed_cursor):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        self._save_feed_cursor(cursor, feed, feed_cursor)
         conn.commit()
         conn.close()
-        return True
+    
+    def confirm_payments(self, deal_ids: List[str], feed: Optional[str] = None, feed_cursor=None) -> List[str]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        confirmed = []
+        
+        for deal_id in deal_ids:
+            cursor.execute("""
+                UPDATE deals SET status = 'payment_confirmed'
+                WHERE deal_id = ? AND status = 'pending'
+            """, (deal_id,))
+            if cursor.rowcount > 0:
+                confirmed.append(deal_id)
+        
+        if feed is not None:
+            self._save_feed_cursor(cursor, feed, feed_cursor)
+        
+        conn.commit()
+        conn.close()
+        return confirmed
+    
+    def get_awaiting_deals(self) -> List[AwaitingDeal]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(AwaitingDeal)
+        cursor.execute(f"SELECT {AWAITING_DEAL_COLUMNS} FROM deals WHERE status = 'pending'")
+        deals = cursor.fetchall()
+        conn.close()
+        return deals
     
     def complete_deal(self, deal_id: str) -> bool:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE deals SET status = 'completed', completed_at = CURRENT_TIMESTAMP 
-            WHERE deal_id = ?
+            WHERE deal_id = ? AND status != 'completed'
         """, (deal_id,))
         
+        if cursor.rowcount == 0:
+            conn.close()
+            return False
+        
         cursor.execute("SELECT seller_id, buyer_id FROM deals WHERE deal_id = ?", (deal_id,))
-        result = cursor.fetchone()
+        seller_id, buyer_id = cursor.fetchone()
+        participants = [seller_id, buyer_id] if buyer_id else [seller_id]
+        
+        for participant_id in participants:
+            cursor.execute("UPDATE users SET successful_deals = successful_deals + 1 WHERE user_id = ?", (participant_id,))
         
-        if result:
-            seller_id, buyer_id = result
-            cursor.execute("UPDATE users SET successful_deals = successful_deals + 1 WHERE user_id = ?", (seller_id,))
-            if buyer_id:
-                cursor.execute("UPDATE users SET successful_deals = successful_deals + 1 WHERE user_id = ?", (buyer_id,))
+        placeholders = ", ".join("?" * len(participants))
+        cursor.execute(f"""
+            UPDATE users SET referral_deals = referral_deals + 1
+            WHERE user_id IN (SELECT referrer_id FROM referrals WHERE referee_id IN ({placeholders}))
+        """, participants)
         
         conn.commit()
         conn.close()
         return True
     
-    def get_all_deals(self) -> List[Dict[str, Any]]:
+    def get_all_deals(self, limit: Optional[int] = None) -> List[Deal]:
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM deals ORDER BY created_at DESC")
-        rows = cursor.fetchall()
+        cursor.row_factory = row_factory(Deal)
+        if limit is None:
+            cursor.execute(f"SELECT {DEAL_COLUMNS} FROM deals ORDER BY created_at DESC")
+        else:
+            cursor.execute(f"SELECT {DEAL_COLUMNS} FROM deals ORDER BY created_at DESC LIMIT ?", (limit,))
+        deals = cursor.fetchall()
         conn.close()
-        
-        deals = []
-        for row in rows:
-            deals.append({
-                'deal_id': row[0],
-                'seller_id': row[1],
-                'buyer_id': row[2],
-                'amount': row[3],
-                'description': row[4],
-                'payment_type': row[5],
-                'payment_address': row[6],
-                'status': row[7],
-                'created_at': row[8],
-                'completed_at': row[9]
-            })
         return deals
     
+    def count_deals(self) -> int:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM deals")
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
     def set_user_successful_deals(self, user_id: int, count: int) -> bool:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -256,3 +311,79 @@ class Database:
         conn.commit()
         conn.close()
         return True
+    
+    def create_broadcast(self, text: str, created_by: int) -> int:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO broadcasts (text, created_by) VALUES (?, ?)", (text, created_by))
+        broadcast_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return broadcast_id
+    
+    def get_broadcast(self, broadcast_id: int) -> Optional[Broadcast]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(Broadcast)
+        cursor.execute(f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE broadcast_id = ?", (broadcast_id,))
+        broadcast = cursor.fetchone()
+        conn.close()
+        return broadcast
+    
+    def get_running_broadcasts(self) -> List[Broadcast]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(Broadcast)
+        cursor.execute(f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE status = 'running' ORDER BY broadcast_id")
+        broadcasts = cursor.fetchall()
+        conn.close()
+        return broadcasts
+    
+    def get_broadcast_recipients(self, broadcast_id: int, after_user_id: int, limit: int) -> List[int]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT user_id FROM users
+            WHERE user_id > ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM broadcast_deliveries d
+                  WHERE d.broadcast_id = ? AND d.user_id = users.user_id
+              )
+            ORDER BY user_id
+            LIMIT ?
+        """, (after_user_id, broadcast_id, limit))
+        user_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return user_ids
+    
+    def record_broadcast_delivery(self, broadcast_id: int, user_id: int, delivered: bool):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR IGNORE INTO broadcast_deliveries (broadcast_id, user_id, delivered)
+            VALUES (?, ?, ?)
+        """, (broadcast_id, user_id, int(delivered)))
+        if cursor.rowcount > 0:
+            counter = "sent" if delivered else "failed"
+            cursor.execute(f"UPDATE broadcasts SET {counter} = {counter} + 1 WHERE broadcast_id = ?", (broadcast_id,))
+        conn.commit()
+        conn.close()
+    
+    def advance_broadcast_cursor(self, broadcast_id: int, last_user_id: int):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE broadcasts SET last_user_id = ? WHERE broadcast_id = ?", (last_user_id, broadcast_id))
+        conn.commit()
+        conn.close()
+    
+    def finish_broadcast(self, broadcast_id: int, status: str = 'completed') -> bool:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE broadcasts SET status = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE broadcast_id = ? AND status = 'running'
+        """, (status, broadcast_id))
+        rows_affected = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return rows_affected > 0
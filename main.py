@@ -1,31 +1,49 @@
 import os
+import re
+import asyncio
 import logging
 import string
 import random
+from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    TypeHandler,
+    ApplicationHandlerStop,
     ContextTypes,
     filters,
     ConversationHandler
 )
 from database import Database
+from models import Deal
+from payments import PaymentWatcher, provider_from_env
+from ratelimit import AsyncRateLimiter, FloodControl
+from broadcast import Broadcaster
+from backup import BackupManager, BackupError
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
-db = Database()
+db: Optional[Database] = None
+payment_watcher: Optional[PaymentWatcher] = None
+notification_limiter: Optional[AsyncRateLimiter] = None
+flood_control: Optional[FloodControl] = None
+broadcaster: Optional[Broadcaster] = None
+backup_manager: Optional[BackupManager] = None
+
+MAX_MESSAGE_LENGTH = 4000
+BOT_LINK = "https://t.me/OtcNinjaRobot"
+REFERRAL_PREFIX = "ref_"
+DEAL_ID_LENGTH = 8
+# Whole 8-character IDs only, so "?start=<id>" links work but "ref_<user_id>" payloads and longer words do not.
+DEAL_ID_PATTERN = re.compile(rf"(?<![A-Za-z0-9_])[A-Za-z0-9]{{{DEAL_ID_LENGTH}}}(?![A-Za-z0-9_])")
 
 AWAITING_TON_WALLET, AWAITING_BANK_CARD = range(2)
 AWAITING_DEAL_AMOUNT, AWAITING_DEAL_DESCRIPTION = range(2, 4)
 
-def generate_deal_id(length=8):
+def generate_deal_id(length=DEAL_ID_LENGTH):
     chars = string.ascii_letters + string.digits
     return ''.join(random.choice(chars) for _ in range(length))
 
@@ -33,6 +51,7 @@ def get_main_menu_keyboard():
     keyboard = [
         [InlineKeyboardButton("💼 Управление реквизитами", callback_data="manage_payment")],
         [InlineKeyboardButton("💸 Создать сделку", callback_data="create_deal")],
+        [InlineKeyboardButton("👥 Реферальная система", callback_data="referrals")],
         [InlineKeyboardButton("🌐 Изменить язык", callback_data="change_language")],
         [InlineKeyboardButton("🧠 Поддержка", callback_data="support")]
     ]
@@ -41,14 +60,52 @@ def get_main_menu_keyboard():
 def get_back_button():
     return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Вернуться в меню", callback_data="main_menu")]])
 
+def parse_deal_ids(text):
+    return list(dict.fromkeys(DEAL_ID_PATTERN.findall(text)))
+
+def split_message(lines):
+    chunks = []
+    current = ""
+    for line in lines:
+        if current and len(current) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            chunks.append(current)
+            current = ""
+        current += line + "\n"
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def send_limited(bot, chat_id: int, text: str, **kwargs) -> bool:
+    await notification_limiter.acquire()
+    try:
+        await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to send message to {chat_id}: {e}")
+        return False
+
+async def flood_guard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not flood_control.allow(user.id if user else None):
+        if update.callback_query:
+            try:
+                await update.callback_query.answer("⏳ Слишком часто, попробуйте через пару секунд.")
+            except Exception as e:
+                logger.warning(f"Failed to answer throttled callback: {e}")
+        raise ApplicationHandlerStop
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    db.create_or_update_user(user.id, user.username)
+    payload = context.args[0] if context.args else None
     
-    if context.args and len(context.args) > 0:
-        deal_id = context.args[0]
-        await handle_deal_join(update, context, deal_id)
-        return
+    if payload and payload.startswith(REFERRAL_PREFIX):
+        await handle_referral_start(update, context, payload[len(REFERRAL_PREFIX):])
+    else:
+        db.create_or_update_user(user.id, user.username)
+        
+        if payload:
+            await handle_deal_join(update, context, payload)
+            return
     
     welcome_text = (
         "👋 Добро пожаловать в Ninja OTC – надёжный P2P-гарант! 💼\n"
@@ -63,6 +120,25 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(welcome_text, reply_markup=get_main_menu_keyboard())
 
+async def handle_referral_start(update: Update, context: ContextTypes.DEFAULT_TYPE, referrer: str):
+    user = update.effective_user
+    
+    try:
+        referrer_id = int(referrer)
+    except ValueError:
+        db.create_or_update_user(user.id, user.username)
+        return
+    
+    if not db.create_user_with_referral(user.id, user.username, referrer_id):
+        return
+    
+    username = f"@{user.username}" if user.username else f"ID {user.id}"
+    await send_limited(
+        context.bot,
+        referrer_id,
+        f"👥 По вашей реферальной ссылке зарегистрировался пользователь {username}."
+    )
+
 async def handle_deal_join(update: Update, context: ContextTypes.DEFAULT_TYPE, deal_id: str):
     deal = db.get_deal(deal_id)
     
@@ -73,31 +149,31 @@ async def handle_deal_join(update: Update, context: ContextTypes.DEFAULT_TYPE, d
     buyer = update.effective_user
     db.create_or_update_user(buyer.id, buyer.username)
     
-    if buyer.id == deal['seller_id']:
+    if buyer.id == deal.seller_id:
         await update.message.reply_text("❌ Вы не можете присоединиться к своей собственной сделке.")
         return
     
-    if deal['buyer_id'] is not None and deal['buyer_id'] != buyer.id:
+    if deal.buyer_id is not None and deal.buyer_id != buyer.id:
         await update.message.reply_text("❌ К этой сделке уже присоединился другой покупатель.")
         return
     
-    if deal['buyer_id'] is None:
+    if deal.buyer_id is None:
         db.set_deal_buyer(deal_id, buyer.id)
     
-    seller = db.get_user(deal['seller_id'])
-    seller_username = f"@{seller['username']}" if seller['username'] else f"ID {seller['user_id']}"
+    seller = db.get_user(deal.seller_id)
+    seller_username = f"@{seller.username}" if seller.username else f"ID {seller.user_id}"
     
     buyer_user = db.get_user(buyer.id)
-    buyer_deals = buyer_user['successful_deals'] if buyer_user else 0
+    buyer_deals = buyer_user.successful_deals if buyer_user else 0
     
     deal_info = (
         f"💳 Информация о сделке #{deal_id}\n"
         f"👤 Вы покупатель в сделке.\n"
-        f"📌 Продавец: {seller_username} (ID {deal['seller_id']})\n"
-        f"• Успешные сделки: {seller['successful_deals']}\n"
-        f"• Вы покупаете: {deal['description']}\n"
-        f"🏦 Адрес для оплаты: {deal['payment_address']}\n"
-        f"💰 Сумма к оплате: {deal['amount']} {deal['payment_type']}\n"
+        f"📌 Продавец: {seller_username} (ID {deal.seller_id})\n"
+        f"• Успешные сделки: {seller.successful_deals}\n"
+        f"• Вы покупаете: {deal.description}\n"
+        f"🏦 Адрес для оплаты: {deal.payment_address}\n"
+        f"💰 Сумма к оплате: {deal.amount} {deal.payment_type}\n"
         f"📝 Комментарий к платежу (мемо): `{deal_id}` (можно скопировать)\n\n"
         f"⚠️ Пожалуйста, убедитесь в правильности данных перед оплатой.\n"
         f"Комментарий (мемо) обязателен!"
@@ -116,12 +192,17 @@ async def handle_deal_join(update: Update, context: ContextTypes.DEFAULT_TYPE, d
     )
     
     try:
-        await context.bot.send_message(chat_id=deal['seller_id'], text=seller_notification)
+        await context.bot.send_message(chat_id=deal.seller_id, text=seller_notification)
     except Exception as e:
         logger.error(f"Failed to notify seller: {e}")
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    
+    if query.data.startswith("confirm_payment_"):
+        await handle_payment_confirmation_button(update, context)
+        return
+    
     await query.answer()
     
     if query.data == "main_menu":
@@ -130,6 +211,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_payment_management(update, context)
     elif query.data == "create_deal":
         await show_deal_creation(update, context)
+    elif query.data == "referrals":
+        await show_referrals(update, context)
     elif query.data == "change_language":
         await show_language_change(update, context)
     elif query.data == "support":
@@ -140,8 +223,6 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await request_bank_card(update, context)
     elif query.data.startswith("deal_type_"):
         await handle_deal_type_selection(update, context)
-    elif query.data.startswith("confirm_payment_"):
-        await handle_payment_confirmation_button(update, context)
     elif query.data.startswith("confirm_receipt_"):
         await handle_receipt_confirmation(update, context)
 
@@ -165,8 +246,8 @@ async def show_payment_management(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     user = db.get_user(query.from_user.id)
     
-    ton_wallet = user['ton_wallet'] if user and user['ton_wallet'] else "не указан"
-    bank_card = user['bank_card'] if user and user['bank_card'] else "не указана"
+    ton_wallet = user.ton_wallet if user and user.ton_wallet else "не указан"
+    bank_card = user.bank_card if user and user.bank_card else "не указана"
     
     text = (
         "💼 Управление реквизитами\n\n"
@@ -245,7 +326,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user = db.get_user(user_id)
             
             if deal_type == 'ton':
-                payment_address = user['ton_wallet'] if user and user['ton_wallet'] else None
+                payment_address = user.ton_wallet if user and user.ton_wallet else None
                 payment_type = "TON"
                 if not payment_address:
                     await update.message.reply_text(
@@ -255,7 +336,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     del context.user_data['awaiting']
                     return
             elif deal_type == 'card':
-                payment_address = user['bank_card'] if user and user['bank_card'] else None
+                payment_address = user.bank_card if user and user.bank_card else None
                 payment_type = "RUB"
                 if not payment_address:
                     await update.message.reply_text(
@@ -265,7 +346,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     del context.user_data['awaiting']
                     return
             elif deal_type == 'stars':
-                payment_address = user['ton_wallet'] if user and user['ton_wallet'] else "Оплата через Telegram Stars"
+                payment_address = user.ton_wallet if user and user.ton_wallet else "Оплата через Telegram Stars"
                 payment_type = "Stars"
             else:
                 payment_address = None
@@ -289,7 +370,9 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 del context.user_data['awaiting']
                 return
             
-            deal_link = f"https://t.me/OtcNinjaRobot?start={deal_id}"
+            payment_watcher.track(deal_id, amount, payment_type, payment_address)
+            
+            deal_link = f"{BOT_LINK}?start={deal_id}"
             
             await update.message.reply_text(
                 f"✅ Сделка создана!\n\n"
@@ -332,6 +415,22 @@ async def handle_deal_type_selection(update: Update, context: ContextTypes.DEFAU
         reply_markup=get_back_button()
     )
 
+async def show_referrals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = query.from_user.id
+    user = db.get_user(user_id)
+    
+    referral_count = user.referral_count if user else 0
+    referral_deals = user.referral_deals if user else 0
+    
+    await query.edit_message_text(
+        "👥 Реферальная система\n\n"
+        f"Ваша ссылка для приглашения:\n{BOT_LINK}?start={REFERRAL_PREFIX}{user_id}\n\n"
+        f"Приглашено пользователей: {referral_count}\n"
+        f"Завершённых сделок рефералов: {referral_deals}",
+        reply_markup=get_back_button()
+    )
+
 async def show_language_change(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.edit_message_text(
@@ -348,7 +447,37 @@ async def show_support(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_payment_confirmation_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer("⚠️ Оплата не найдена", show_alert=True)
+    deal_id = query.data.replace("confirm_payment_", "")
+    
+    paid = payment_watcher.payment_status(deal_id)
+    if paid is None:
+        deal = db.get_deal(deal_id)
+        paid = deal is not None and deal.status != 'pending'
+    
+    if paid:
+        await query.answer("✅ Оплата получена! Ожидайте отправки товара продавцом.", show_alert=True)
+    else:
+        await query.answer("⚠️ Оплата не найдена", show_alert=True)
+
+async def notify_payment_confirmed(bot, deal: Deal) -> bool:
+    deal_id = deal.deal_id
+    sends = [send_limited(
+        bot,
+        deal.seller_id,
+        f"✅ Оплата по сделке #{deal_id} подтверждена. Можете отправить товар покупателю."
+    )]
+    
+    if deal.buyer_id:
+        keyboard = [[InlineKeyboardButton("✅ Подтвердить получение", callback_data=f"confirm_receipt_{deal_id}")]]
+        sends.append(send_limited(
+            bot,
+            deal.buyer_id,
+            f"✅ Оплата подтверждена! Ожидайте получения товара по сделке #{deal_id}.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        ))
+    
+    results = await asyncio.gather(*sends)
+    return all(results)
 
 async def handle_receipt_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -359,11 +488,11 @@ async def handle_receipt_confirmation(update: Update, context: ContextTypes.DEFA
         await query.answer("❌ Сделка не найдена")
         return
     
-    if deal['buyer_id'] != query.from_user.id:
+    if deal.buyer_id != query.from_user.id:
         await query.answer("❌ Только покупатель может подтвердить получение", show_alert=True)
         return
     
-    if deal['status'] != 'payment_confirmed':
+    if deal.status != 'payment_confirmed':
         await query.answer("❌ Оплата ещё не подтверждена", show_alert=True)
         return
     
@@ -375,7 +504,7 @@ async def handle_receipt_confirmation(update: Update, context: ContextTypes.DEFA
     
     try:
         await context.bot.send_message(
-            chat_id=deal['seller_id'],
+            chat_id=deal.seller_id,
             text=f"✅ Покупатель подтвердил получение товара. Сделка #{deal_id} успешно завершена."
         )
     except Exception as e:
@@ -388,37 +517,36 @@ async def buy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ У вас нет прав для выполнения этой команды.")
         return
     
-    if not context.args or len(context.args) < 1:
-        await update.message.reply_text("❌ Использование: /buy <deal_id>")
-        return
-    
-    deal_id = context.args[0]
-    deal = db.get_deal(deal_id)
+    deal_ids = parse_deal_ids(" ".join(context.args or []))
     
-    if not deal:
-        await update.message.reply_text(f"❌ Сделка #{deal_id} не найдена.")
+    if not deal_ids:
+        await update.message.reply_text("❌ Использование: /buy <deal_id> [deal_id ...]")
         return
     
-    db.confirm_payment(deal_id)
-    
-    await update.message.reply_text(f"✅ Оплата по сделке #{deal_id} подтверждена.")
-    
-    try:
-        buyer_id = deal['buyer_id']
-        await context.bot.send_message(
-            chat_id=deal['seller_id'],
-            text=f"✅ Оплата по сделке #{deal_id} подтверждена. Можете отправить товар покупателю."
-        )
-        
-        if buyer_id:
-            keyboard = [[InlineKeyboardButton("✅ Подтвердить получение", callback_data=f"confirm_receipt_{deal_id}")]]
-            await context.bot.send_message(
-                chat_id=buyer_id,
-                text=f"✅ Оплата подтверждена! Ожидайте получения товара по сделке #{deal_id}.",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-    except Exception as e:
-        logger.error(f"Failed to send notifications: {e}")
+    deals = db.get_deals(deal_ids)
+    pending_ids = [deal_id for deal_id in deal_ids if deal_id in deals and deals[deal_id].status == 'pending']
+    confirmed_ids = db.confirm_payments(pending_ids)
+    payment_watcher.mark_confirmed(confirmed_ids)
+    
+    notified = await asyncio.gather(*(notify_payment_confirmed(context.bot, deals[deal_id]) for deal_id in confirmed_ids))
+    notified = dict(zip(confirmed_ids, notified))
+    
+    lines = []
+    if len(deal_ids) > 1:
+        lines.append(f"📋 Подтверждено {len(confirmed_ids)} из {len(deal_ids)} сделок:\n")
+    
+    for deal_id in deal_ids:
+        if deal_id not in deals:
+            lines.append(f"❌ Сделка #{deal_id} не найдена.")
+        elif deal_id not in notified:
+            lines.append(f"⚠️ Сделка #{deal_id} уже в статусе {deals[deal_id].status}.")
+        elif notified[deal_id]:
+            lines.append(f"✅ Оплата по сделке #{deal_id} подтверждена.")
+        else:
+            lines.append(f"✅ Оплата по сделке #{deal_id} подтверждена (уведомления не доставлены).")
+    
+    for chunk in split_message(lines):
+        await update.message.reply_text(chunk)
 
 async def add_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -512,6 +640,128 @@ async def set_my_deals_command(update: Update, context: ContextTypes.DEFAULT_TYP
     else:
         await update.message.reply_text("❌ Ошибка при обновлении данных.")
 
+async def flood_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    
+    if not db.is_owner(user_id):
+        await update.message.reply_text("❌ Только владельцы могут просматривать статистику.")
+        return
+    
+    stats = flood_control.stats()
+    await update.message.reply_text(
+        "🛡 Защита от флуда\n\n"
+        f"Пропущено обновлений: {stats['passed']}\n"
+        f"Отброшено (лимит пользователя): {stats['shed_user']}\n"
+        f"Отброшено (общий лимит): {stats['shed_global']}\n"
+        f"Отслеживается пользователей: {stats['tracked_users']}"
+    )
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    
+    if not db.is_owner(user_id):
+        await update.message.reply_text("❌ Только владельцы могут делать рассылку.")
+        return
+    
+    parts = update.message.text.split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip():
+        await update.message.reply_text("❌ Использование: /broadcast <текст>")
+        return
+    
+    broadcast_id = db.create_broadcast(parts[1].strip(), user_id)
+    broadcaster.start(context.bot, broadcast_id)
+    
+    await update.message.reply_text(
+        f"✅ Рассылка #{broadcast_id} запущена.\n"
+        f"Остановить: /broadcast_cancel {broadcast_id}"
+    )
+
+async def broadcast_cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    
+    if not db.is_owner(user_id):
+        await update.message.reply_text("❌ Только владельцы могут останавливать рассылку.")
+        return
+    
+    if not context.args or len(context.args) < 1:
+        await update.message.reply_text("❌ Использование: /broadcast_cancel <id>")
+        return
+    
+    try:
+        broadcast_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("❌ Неверный ID рассылки.")
+        return
+    
+    if broadcaster.cancel(broadcast_id):
+        broadcast = db.get_broadcast(broadcast_id)
+        await update.message.reply_text(
+            f"✅ Рассылка #{broadcast_id} остановлена.\n"
+            f"Отправлено: {broadcast.sent}, ошибок: {broadcast.failed}"
+        )
+    else:
+        await update.message.reply_text(f"❌ Рассылка #{broadcast_id} не найдена или уже завершена.")
+
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    
+    if not db.is_owner(user_id):
+        await update.message.reply_text("❌ Только владельцы могут создавать резервные копии.")
+        return
+    
+    try:
+        result = await backup_manager.create_backup()
+    except Exception as e:
+        logger.error(f"Backup failed: {e}")
+        await update.message.reply_text(f"❌ Ошибка резервного копирования: {e}")
+        return
+    
+    await update.message.reply_text(
+        f"✅ Резервная копия создана: {os.path.basename(result.path)}\n"
+        f"Размер: {result.size / 1024:.1f} КБ\n"
+        f"Время: {result.duration:.2f} с"
+    )
+
+async def restore_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    
+    if not db.is_owner(user_id):
+        await update.message.reply_text("❌ Только владельцы могут восстанавливать базу данных.")
+        return
+    
+    if not context.args or len(context.args) < 1:
+        backups = backup_manager.list_backups()
+        if not backups:
+            await update.message.reply_text("📦 Резервных копий пока нет.")
+            return
+        await update.message.reply_text(
+            "📦 Доступные резервные копии:\n\n" + "\n".join(backups) +
+            "\n\nИспользование: /restore <имя файла>"
+        )
+        return
+    
+    await broadcaster.stop()
+    await payment_watcher.stop()
+    
+    try:
+        result = await backup_manager.restore(context.args[0])
+    except BackupError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    except Exception as e:
+        logger.error(f"Restore failed: {e}")
+        await update.message.reply_text(f"❌ Ошибка восстановления: {e}")
+        return
+    finally:
+        payment_watcher.load_index()
+        payment_watcher.start()
+        broadcaster.resume_all(context.bot)
+    
+    await update.message.reply_text(
+        f"✅ База данных восстановлена из {os.path.basename(result.path)} за {result.duration:.2f} с.\n"
+        f"Текущее состояние сохранено в отдельную копию перед восстановлением."
+    )
+
 async def deals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
@@ -519,48 +769,94 @@ async def deals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Только владельцы могут просматривать все сделки.")
         return
     
-    deals = db.get_all_deals()
+    deals = db.get_all_deals(limit=20)
     
     if not deals:
         await update.message.reply_text("📋 Сделок пока нет.")
         return
     
+    total = db.count_deals()
+    users = db.get_users(list({deal.seller_id for deal in deals} | {deal.buyer_id for deal in deals if deal.buyer_id}))
+    
     text = "📋 Все сделки в боте:\n\n"
     
-    for deal in deals[:20]:
-        seller = db.get_user(deal['seller_id'])
-        seller_id_str = deal['seller_id']
-        seller_username = f"@{seller['username']}" if seller and seller['username'] else "не указан"
-        seller_info = f"{seller_username} (ID {seller_id_str})" if seller and seller['username'] else f"ID {seller_id_str}"
+    for deal in deals:
+        seller = users.get(deal.seller_id)
+        seller_id_str = deal.seller_id
+        seller_username = f"@{seller.username}" if seller and seller.username else "не указан"
+        seller_info = f"{seller_username} (ID {seller_id_str})" if seller and seller.username else f"ID {seller_id_str}"
         
         buyer_info = "не присоединился"
-        if deal['buyer_id']:
-            buyer = db.get_user(deal['buyer_id'])
-            buyer_id_str = deal['buyer_id']
-            buyer_username = f"@{buyer['username']}" if buyer and buyer['username'] else "не указан"
-            buyer_info = f"{buyer_username} (ID {buyer_id_str})" if buyer and buyer['username'] else f"ID {buyer_id_str}"
+        if deal.buyer_id:
+            buyer = users.get(deal.buyer_id)
+            buyer_id_str = deal.buyer_id
+            buyer_username = f"@{buyer.username}" if buyer and buyer.username else "не указан"
+            buyer_info = f"{buyer_username} (ID {buyer_id_str})" if buyer and buyer.username else f"ID {buyer_id_str}"
         
         text += f"📌 Продавец: {seller_info}\n"
         text += f"👤 Покупатель: {buyer_info}\n"
-        text += f"• Покупка: {deal['description']}\n"
-        text += f"🏦 Адрес для оплаты: {deal['payment_address']}\n"
-        text += f"💰 Сумма к оплате: {deal['amount']} {deal['payment_type']}\n\n"
+        text += f"• Покупка: {deal.description}\n"
+        text += f"🏦 Адрес для оплаты: {deal.payment_address}\n"
+        text += f"💰 Сумма к оплате: {deal.amount} {deal.payment_type}\n\n"
     
-    if len(deals) > 20:
-        text += f"... и ещё {len(deals) - 20} сделок"
+    if total > len(deals):
+        text += f"... и ещё {total - len(deals)} сделок"
     
     await update.message.reply_text(text)
 
-def main():
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
+async def post_init(application: Application):
+    async def on_payments_confirmed(deal_ids):
+        deals = db.get_deals(deal_ids)
+        await asyncio.gather(*(notify_payment_confirmed(application.bot, deal) for deal in deals.values()))
+    
+    payment_watcher.on_confirmed = on_payments_confirmed
+    payment_watcher.load_index()
+    payment_watcher.start()
+    broadcaster.resume_all(application.bot)
+    backup_manager.start()
+
+async def post_shutdown(application: Application):
+    await payment_watcher.stop()
+    await broadcaster.stop()
+    await backup_manager.stop()
+
+def create_app(token: str, db_path: str = "ninja_otc.db") -> Application:
+    global db, payment_watcher, notification_limiter, flood_control, broadcaster, backup_manager
+    
+    db = Database(db_path)
+    payment_watcher = PaymentWatcher(
+        db,
+        provider_from_env(),
+        interval=float(os.getenv("PAYMENT_POLL_INTERVAL", "15"))
+    )
+    notification_limiter = AsyncRateLimiter(float(os.getenv("NOTIFY_RATE_LIMIT", "25")))
+    flood_control = FloodControl(
+        user_rate=float(os.getenv("FLOOD_USER_RATE", "1")),
+        user_burst=float(os.getenv("FLOOD_USER_BURST", "5")),
+        global_rate=float(os.getenv("FLOOD_GLOBAL_RATE", "50")),
+        global_burst=float(os.getenv("FLOOD_GLOBAL_BURST", "100"))
+    )
+    broadcaster = Broadcaster(
+        db,
+        notification_limiter,
+        concurrency=int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+    )
+    backup_manager = BackupManager(
+        db_path,
+        backup_dir=os.getenv("BACKUP_DIR", "backups"),
+        keep=int(os.getenv("BACKUP_KEEP", "7")),
+        interval=float(os.getenv("BACKUP_INTERVAL", str(6 * 3600)))
+    )
     
-    if not token:
-        logger.error("TELEGRAM_BOT_TOKEN environment variable not set!")
-        print("❌ Ошибка: Переменная окружения TELEGRAM_BOT_TOKEN не установлена!")
-        print("Пожалуйста, добавьте токен вашего Telegram бота в Secrets.")
-        return
+    application = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
-    application = Application.builder().token(token).build()
+    application.add_handler(TypeHandler(Update, flood_guard), group=-1)
     
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("buy", buy_command))
@@ -568,11 +864,34 @@ def main():
     application.add_handler(CommandHandler("del", del_admin_command))
     application.add_handler(CommandHandler("set_my_deals", set_my_deals_command))
     application.add_handler(CommandHandler("deals", deals_command))
+    application.add_handler(CommandHandler("flood_stats", flood_stats_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("broadcast_cancel", broadcast_cancel_command))
+    application.add_handler(CommandHandler("backup", backup_command))
+    application.add_handler(CommandHandler("restore", restore_command))
     
     application.add_handler(CallbackQueryHandler(button_handler))
     
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
     
+    return application
+
+def main():
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    
+    if not token:
+        logger.error("TELEGRAM_BOT_TOKEN environment variable not set!")
+        print("❌ Ошибка: Переменная окружения TELEGRAM_BOT_TOKEN не установлена!")
+        print("Пожалуйста, добавьте токен вашего Telegram бота в Secrets.")
+        return
+    
+    application = create_app(token, os.getenv("DATABASE_PATH", "ninja_otc.db"))
+    
     logger.info("Bot started successfully!")
     print("✅ Бот Ninja OTC запущен успешно!")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,199 @@
+import sqlite3
+import logging
+from typing import Optional, List, Callable, Any, Sequence
+
+logger = logging.getLogger(__name__)
+
+class Migration:
+    def __init__(self, version: int, schema: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 backfill: Optional[Callable[[sqlite3.Connection, int], None]] = None):
+        self.version = version
+        self.schema = schema
+        self.backfill = backfill
+
+def backfill_in_batches(conn: sqlite3.Connection, version: int, select_sql: str, start_key: Any,
+                        apply: Callable[[sqlite3.Connection, List[Sequence[Any]]], None],
+                        batch_size: int = 500) -> int:
+    # select_sql pages by key: "SELECT key, ... WHERE key > ? ORDER BY key LIMIT ?".
+    # Each batch commits together with its last key, so an interrupted backfill
+    # resumes after the last committed batch and never holds the write lock for long.
+    saved = conn.execute(
+        "SELECT backfill_key FROM schema_migrations WHERE version = ?", (version,)
+    ).fetchone()
+    last_key = saved[0] if saved and saved[0] is not None else start_key
+    total = 0
+
+    while True:
+        rows = conn.execute(select_sql, (last_key, batch_size)).fetchall()
+        if not rows:
+            break
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply(conn, rows)
+            conn.execute(
+                "UPDATE schema_migrations SET backfill_key = ? WHERE version = ?",
+                (rows[-1][0], version)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        total += len(rows)
+        last_key = rows[-1][0]
+
+    return total
+
+def _v1_initial_schema(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            ton_wallet TEXT,
+            bank_card TEXT,
+            successful_deals INTEGER DEFAULT 0,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS deals (
+            deal_id TEXT PRIMARY KEY,
+            seller_id INTEGER NOT NULL,
+            buyer_id INTEGER,
+            amount TEXT NOT NULL,
+            description TEXT NOT NULL,
+            payment_type TEXT NOT NULL,
+            payment_address TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (seller_id) REFERENCES users(user_id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS admins (
+            user_id INTEGER PRIMARY KEY,
+            added_by INTEGER NOT NULL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+def _v2_deal_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_deals_status ON deals(status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_deals_created_at ON deals(created_at)")
+
+def _v3_broadcasts(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE broadcasts (
+            broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            created_by INTEGER NOT NULL,
+            status TEXT DEFAULT 'running',
+            last_user_id INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE broadcast_deliveries (
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            delivered INTEGER NOT NULL,
+            PRIMARY KEY (broadcast_id, user_id),
+            FOREIGN KEY (broadcast_id) REFERENCES broadcasts(broadcast_id)
+        ) WITHOUT ROWID
+    """)
+
+def _v4_referrals(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE referrals (
+            referee_id INTEGER PRIMARY KEY,
+            referrer_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (referee_id) REFERENCES users(user_id),
+            FOREIGN KEY (referrer_id) REFERENCES users(user_id)
+        )
+    """)
+    conn.execute("CREATE INDEX idx_referrals_referrer_id ON referrals(referrer_id)")
+    conn.execute("ALTER TABLE users ADD COLUMN referral_count INTEGER DEFAULT 0")
+    conn.execute("ALTER TABLE users ADD COLUMN referral_deals INTEGER DEFAULT 0")
+
+def _v5_payment_feed_state(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE payment_feed_state (
+            feed TEXT PRIMARY KEY,
+            cursor,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, schema=_v1_initial_schema),
+    Migration(2, schema=_v2_deal_indexes),
+    Migration(3, schema=_v3_broadcasts),
+    Migration(4, schema=_v4_referrals),
+    Migration(5, schema=_v5_payment_feed_state),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _set_schema_version(conn: sqlite3.Connection, version: int):
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+def _schema_applied(conn: sqlite3.Connection, version: int) -> bool:
+    row = conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,)).fetchone()
+    return row is not None
+
+def migrate(db_path: str) -> int:
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        current = get_schema_version(conn)
+        if current >= MIGRATIONS[-1].version:
+            return current
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                backfill_key,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+
+            if not _schema_applied(conn, migration.version):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if migration.schema:
+                        migration.schema(conn)
+                    conn.execute("INSERT INTO schema_migrations (version) VALUES (?)", (migration.version,))
+                    if not migration.backfill:
+                        _set_schema_version(conn, migration.version)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+            if migration.backfill:
+                migration.backfill(conn, migration.version)
+                conn.execute("BEGIN IMMEDIATE")
+                _set_schema_version(conn, migration.version)
+                conn.execute("COMMIT")
+
+            current = migration.version
+            logger.info(f"Database migrated to schema version {current}")
+
+        return current
+    finally:
+        conn.close()
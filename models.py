@@ -0,0 +1,48 @@
+from typing import NamedTuple, Optional, Callable, Any, Type
+
+class User(NamedTuple):
+    user_id: int
+    username: Optional[str]
+    ton_wallet: Optional[str]
+    bank_card: Optional[str]
+    successful_deals: int
+    role: str
+    created_at: Optional[str]
+    referral_count: int
+    referral_deals: int
+
+class Deal(NamedTuple):
+    deal_id: str
+    seller_id: int
+    buyer_id: Optional[int]
+    amount: str
+    description: str
+    payment_type: str
+    payment_address: str
+    status: str
+    created_at: Optional[str]
+    completed_at: Optional[str]
+
+class AwaitingDeal(NamedTuple):
+    deal_id: str
+    amount: str
+    payment_type: str
+    payment_address: str
+
+class Broadcast(NamedTuple):
+    broadcast_id: int
+    text: str
+    created_by: int
+    status: str
+    last_user_id: int
+    sent: int
+    failed: int
+    created_at: Optional[str]
+    finished_at: Optional[str]
+
+def columns(model: Type[tuple]) -> str:
+    return ", ".join(model._fields)
+
+def row_factory(model: Type[tuple]) -> Callable[[Any, tuple], Any]:
+    make = model._make
+    return lambda cursor, row: make(row)
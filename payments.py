@@ -0,0 +1,249 @@
+import os
+import json
+import asyncio
+import logging
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class IncomingTransaction:
+    tx_id: str
+    memo: str
+    amount: Decimal
+    recipient: str
+    currency: Optional[str] = None
+
+def parse_amount(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    text = str(value).strip().replace(',', '.').replace(' ', '')
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount <= 0:
+        return None
+    return amount
+
+def normalize_address(value: Any) -> str:
+    return ''.join(str(value).split()) if value is not None else ''
+
+def parse_transaction(data: Dict[str, Any]) -> Optional[IncomingTransaction]:
+    memo = data.get('memo')
+    amount = parse_amount(data.get('amount'))
+    recipient = normalize_address(data.get('to') or data.get('address'))
+    if not memo or amount is None or not recipient:
+        return None
+    return IncomingTransaction(
+        tx_id=str(data.get('tx_id', '')),
+        memo=str(memo).strip(),
+        amount=amount,
+        recipient=recipient,
+        currency=data.get('currency')
+    )
+
+@dataclass
+class TransactionBatch:
+    transactions: List[IncomingTransaction]
+    cursor: Any
+
+class PaymentProvider(ABC):
+    name: str
+    cursor: Any = None
+
+    @abstractmethod
+    async def fetch_transactions(self) -> TransactionBatch:
+        ...
+
+    def commit(self, cursor: Any):
+        self.cursor = cursor
+
+class FilePaymentProvider(PaymentProvider):
+    def __init__(self, path: str):
+        self.path = path
+        self.name = f"file:{os.path.abspath(path)}"
+        self.cursor = 0
+
+    def _read_new_lines(self) -> Tuple[List[str], int]:
+        offset = self.cursor or 0
+        if not os.path.exists(self.path):
+            return [], offset
+
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < offset:
+                offset = 0
+            f.seek(offset)
+            chunk = f.read()
+
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            return [], offset
+        return chunk[:end].decode('utf-8').splitlines(), offset + end + 1
+
+    async def fetch_transactions(self) -> TransactionBatch:
+        lines, offset = await asyncio.to_thread(self._read_new_lines)
+
+        transactions = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                tx = parse_transaction(json.loads(line))
+            except (ValueError, AttributeError):
+                tx = None
+            if tx:
+                transactions.append(tx)
+            else:
+                logger.warning(f"Skipping malformed transaction line: {line!r}")
+        return TransactionBatch(transactions, offset)
+
+class HttpPaymentProvider(PaymentProvider):
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.name = f"http:{url}"
+        self.timeout = timeout
+        self.cursor: Optional[str] = None
+
+    def _fetch(self) -> Dict[str, Any]:
+        url = self.url
+        if self.cursor is not None:
+            separator = '&' if '?' in url else '?'
+            url = f"{url}{separator}{urllib.parse.urlencode({'cursor': self.cursor})}"
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    async def fetch_transactions(self) -> TransactionBatch:
+        data = await asyncio.to_thread(self._fetch)
+
+        transactions = []
+        for item in data.get('transactions', []):
+            tx = parse_transaction(item) if isinstance(item, dict) else None
+            if tx:
+                transactions.append(tx)
+
+        cursor = str(data['cursor']) if data.get('cursor') is not None else self.cursor
+        return TransactionBatch(transactions, cursor)
+
+def provider_from_env() -> Optional[PaymentProvider]:
+    url = os.getenv("PAYMENT_FEED_URL")
+    if url:
+        return HttpPaymentProvider(url)
+    path = os.getenv("PAYMENT_FEED_FILE")
+    if path:
+        return FilePaymentProvider(path)
+    return None
+
+class PaymentWatcher:
+    def __init__(self, db: Database, provider: Optional[PaymentProvider] = None,
+                 interval: float = 15.0, max_confirmed: int = 10000):
+        self.db = db
+        self.provider = provider
+        self.interval = interval
+        self.max_confirmed = max_confirmed
+        self.awaiting: Dict[str, Tuple[Optional[Decimal], str, str]] = {}
+        self.confirmed: Dict[str, None] = {}
+        self.on_confirmed: Optional[Callable[[List[str]], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load_index(self):
+        self.awaiting = {
+            deal.deal_id: (parse_amount(deal.amount), deal.payment_type, normalize_address(deal.payment_address))
+            for deal in self.db.get_awaiting_deals()
+        }
+        self.confirmed = {}
+        if self.provider is not None:
+            self.provider.commit(self.db.get_feed_cursor(self.provider.name))
+        logger.info(f"Payment index loaded: {len(self.awaiting)} awaiting deals")
+
+    def track(self, deal_id: str, amount: str, payment_type: str, payment_address: str):
+        self.awaiting[deal_id] = (parse_amount(amount), payment_type, normalize_address(payment_address))
+
+    def mark_confirmed(self, deal_ids: List[str]):
+        for deal_id in deal_ids:
+            self.awaiting.pop(deal_id, None)
+            self.confirmed[deal_id] = None
+        while len(self.confirmed) > self.max_confirmed:
+            del self.confirmed[next(iter(self.confirmed))]
+
+    def payment_status(self, deal_id: str) -> Optional[bool]:
+        if deal_id in self.confirmed:
+            return True
+        if deal_id in self.awaiting:
+            return False
+        return None
+
+    def match(self, transactions: List[IncomingTransaction]) -> List[str]:
+        matched = []
+        for tx in transactions:
+            entry = self.awaiting.get(tx.memo)
+            if entry is None or tx.memo in matched:
+                continue
+            expected, payment_type, payment_address = entry
+            if expected is None:
+                logger.warning(f"Deal #{tx.memo} has non-numeric amount, needs manual /buy")
+                continue
+            if tx.recipient != payment_address:
+                logger.warning(f"Transaction {tx.tx_id} for deal #{tx.memo} was sent to {tx.recipient}, not the deal's payment address")
+                continue
+            if tx.currency and tx.currency.upper() != payment_type.upper():
+                logger.warning(f"Transaction {tx.tx_id} for deal #{tx.memo} has currency {tx.currency}, expected {payment_type}")
+                continue
+            if tx.amount < expected:
+                logger.warning(f"Transaction {tx.tx_id} for deal #{tx.memo} is underpaid: {tx.amount} < {expected}")
+                continue
+            matched.append(tx.memo)
+        return matched
+
+    async def poll(self) -> List[str]:
+        if self.provider is None:
+            return []
+
+        batch = await self.provider.fetch_transactions()
+        matched = self.match(batch.transactions)
+        if not matched:
+            if batch.cursor != self.provider.cursor:
+                self.db.save_feed_cursor(self.provider.name, batch.cursor)
+                self.provider.commit(batch.cursor)
+            return []
+
+        confirmed = self.db.confirm_payments(matched, self.provider.name, batch.cursor)
+        self.provider.commit(batch.cursor)
+        self.mark_confirmed(matched)
+        logger.info(f"Auto-confirmed {len(confirmed)} of {len(matched)} matched payments")
+
+        if confirmed and self.on_confirmed:
+            await self.on_confirmed(confirmed)
+        return confirmed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Payment poll failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.provider is None or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Payment watcher started, polling every {self.interval}s")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,110 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional, Dict
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, tokens: float = 1.0) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+class AsyncRateLimiter:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.bucket = TokenBucket(rate, capacity)
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                blocked = self.blocked_until - time.monotonic()
+                if blocked > 0:
+                    await asyncio.sleep(blocked)
+                elif self.bucket.try_consume():
+                    return
+                else:
+                    await asyncio.sleep(self.bucket.wait_time())
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class FloodControl:
+    def __init__(self, user_rate: float, user_burst: float, global_rate: float, global_burst: float,
+                 max_users: int = 10000, idle_timeout: float = 300.0):
+        if user_rate <= 0 or global_rate <= 0:
+            raise ValueError("Flood control rates must be positive")
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_users = max_users
+        self.idle_timeout = max(idle_timeout, user_burst / user_rate)
+        self.users: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self.passed = 0
+        self.shed_user = 0
+        self.shed_global = 0
+
+    def _evict(self, now: float):
+        while self.users:
+            user_id, bucket = next(iter(self.users.items()))
+            if len(self.users) <= self.max_users and now - bucket.updated < self.idle_timeout:
+                break
+            del self.users[user_id]
+
+    def allow(self, user_id: Optional[int]) -> bool:
+        now = time.monotonic()
+
+        # Checked without consuming so a globally shed update does not cost the user a token.
+        if self.global_bucket.wait_time() > 0:
+            self.shed_global += 1
+            return False
+
+        if user_id is not None:
+            bucket = self.users.get(user_id)
+            if bucket is None:
+                bucket = TokenBucket(self.user_rate, self.user_burst)
+                self.users[user_id] = bucket
+            else:
+                self.users.move_to_end(user_id)
+            self._evict(now)
+
+            if not bucket.try_consume():
+                self.shed_user += 1
+                return False
+
+        self.global_bucket.try_consume()
+        self.passed += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'passed': self.passed,
+            'shed_user': self.shed_user,
+            'shed_global': self.shed_global,
+            'tracked_users': len(self.users)
+        }
@@ -0,0 +1,55 @@
+import os
+import asyncio
+import sqlite3
+
+import pytest
+
+import backup
+from backup import BackupManager
+from database import Database
+
+@pytest.fixture
+def manager(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    Database(db_path).create_or_update_user(1, "user")
+    return BackupManager(db_path, backup_dir=str(tmp_path / "backups"), keep=2, pages_per_step=1)
+
+def test_backup_creates_verified_snapshot(manager):
+    result = asyncio.run(manager.create_backup())
+    assert os.path.basename(result.path) in manager.list_backups()
+    conn = sqlite3.connect(result.path)
+    assert conn.execute("SELECT username FROM users").fetchone() == ("user",)
+    conn.close()
+
+class FailingConnection:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def backup(self, *args, **kwargs):
+        raise sqlite3.OperationalError("disk full")
+
+    def close(self):
+        self.conn.close()
+
+def test_failed_copy_leaves_no_temp_file(manager, monkeypatch):
+    connect = sqlite3.connect
+    monkeypatch.setattr(backup.sqlite3, "connect", lambda *args, **kwargs: FailingConnection(connect(*args, **kwargs)))
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(manager.create_backup())
+    monkeypatch.undo()
+    assert os.listdir(manager.backup_dir) == []
+
+def test_failed_integrity_check_leaves_no_temp_file(manager, monkeypatch):
+    def broken(path):
+        raise sqlite3.DatabaseError("malformed")
+
+    monkeypatch.setattr(BackupManager, "_check_integrity", staticmethod(broken))
+    with pytest.raises(sqlite3.DatabaseError):
+        asyncio.run(manager.create_backup())
+    assert os.listdir(manager.backup_dir) == []
+
+def test_backups_in_the_same_second_do_not_overwrite(manager):
+    first = asyncio.run(manager.create_backup())
+    second = asyncio.run(manager.create_backup())
+    assert first.path != second.path
+    assert len(manager.list_backups()) == 2
@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram.error import Forbidden, RetryAfter
+
+from broadcast import Broadcaster
+from database import Database
+from ratelimit import AsyncRateLimiter
+
+OWNER = 1000
+
+class FakeBot:
+    def __init__(self, stop_after=None, forbidden=(), flood_limited=()):
+        self.sent = []
+        self.stop_after = stop_after
+        self.forbidden = set(forbidden)
+        self.flood_limited = set(flood_limited)
+        self.stopped = asyncio.Event()
+
+    async def send_message(self, chat_id, text):
+        if chat_id == OWNER:
+            return SimpleNamespace(message_id=1)
+        if chat_id in self.flood_limited:
+            self.flood_limited.discard(chat_id)
+            raise RetryAfter(0.05)
+        if chat_id in self.forbidden:
+            raise Forbidden("bot was blocked by the user")
+        if self.stop_after is not None and len(self.sent) >= self.stop_after:
+            self.stopped.set()
+            await asyncio.Event().wait()
+        self.sent.append(chat_id)
+        return SimpleNamespace(message_id=2)
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        pass
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    for user_id in range(1, 11):
+        db.create_or_update_user(user_id, f"user{user_id}")
+    return db
+
+def make_broadcaster(db):
+    return Broadcaster(db, AsyncRateLimiter(1000), concurrency=2, page_size=4)
+
+def test_resumed_broadcast_sends_no_duplicates(db):
+    broadcast_id = db.create_broadcast("hello", OWNER)
+
+    async def scenario():
+        first_bot = FakeBot(stop_after=5, forbidden=[2])
+        broadcaster = make_broadcaster(db)
+        broadcaster.start(first_bot, broadcast_id)
+        await asyncio.wait_for(first_bot.stopped.wait(), 5)
+        await broadcaster.stop()
+
+        interrupted = db.get_broadcast(broadcast_id)
+        assert interrupted.status == 'running'
+        assert interrupted.sent == len(first_bot.sent)
+        assert interrupted.failed == 1
+
+        second_bot = FakeBot(forbidden=[2])
+        resumed = make_broadcaster(db)
+        resumed.resume_all(second_bot)
+        await asyncio.wait_for(asyncio.gather(*resumed.tasks.values()), 5)
+        return first_bot.sent + second_bot.sent
+
+    delivered = asyncio.run(scenario())
+
+    assert sorted(delivered) == [1] + list(range(3, 11))
+    broadcast = db.get_broadcast(broadcast_id)
+    assert broadcast.status == 'completed'
+    assert (broadcast.sent, broadcast.failed) == (9, 1)
+
+def test_flood_limit_pauses_shared_limiter(db):
+    broadcast_id = db.create_broadcast("hello", OWNER)
+    bot = FakeBot(flood_limited=[3])
+    broadcaster = make_broadcaster(db)
+
+    asyncio.run(broadcaster.run(bot, broadcast_id))
+
+    assert broadcaster.limiter.blocked_until > 0
+    assert sorted(bot.sent) == list(range(1, 11))
+    assert db.get_broadcast(broadcast_id).sent == 10
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+import main
+from database import Database
+from payments import FilePaymentProvider, PaymentWatcher
+from ratelimit import AsyncRateLimiter
+
+ADMIN = 8200529043
+
+class FakeBot:
+    def __init__(self, unreachable=()):
+        self.sent = []
+        self.unreachable = set(unreachable)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.unreachable:
+            raise RuntimeError("chat not found")
+        self.sent.append((chat_id, text))
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+@pytest.fixture
+def bot_state(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / "test.db"))
+    db.create_or_update_user(1, "seller")
+    db.create_or_update_user(2, "buyer")
+    db.create_or_update_user(3, "blocked")
+    db.create_deal("AbCd1234", 1, "10", "gift", "TON", "UQ-wallet")
+    db.create_deal("EfGh5678", 3, "5", "gift", "TON", "UQ-wallet")
+    db.create_deal("IjKl9012", 1, "7", "gift", "TON", "UQ-wallet")
+    db.set_deal_buyer("AbCd1234", 2)
+    db.confirm_payments(["IjKl9012"])
+
+    watcher = PaymentWatcher(db, FilePaymentProvider(str(tmp_path / "feed.jsonl")))
+    watcher.load_index()
+    monkeypatch.setattr(main, "db", db)
+    monkeypatch.setattr(main, "payment_watcher", watcher)
+    monkeypatch.setattr(main, "notification_limiter", AsyncRateLimiter(1000))
+    return db, watcher
+
+def run_buy(args, bot):
+    message = FakeMessage()
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=ADMIN), message=message)
+    context = SimpleNamespace(args=args, bot=bot)
+    asyncio.run(main.buy_command(update, context))
+    return message.replies
+
+def test_parse_deal_ids():
+    text = (
+        "AbCd1234, EfGh5678 https://t.me/OtcNinjaRobot?start=IjKl9012 "
+        "AbCd1234 confirmed TooLongId123 short ?start=ref_12345678"
+    )
+    assert main.parse_deal_ids(text) == ["AbCd1234", "EfGh5678", "IjKl9012"]
+    assert main.DEAL_ID_PATTERN.fullmatch(main.generate_deal_id())
+
+def test_buy_confirms_many_deals_and_summarises(bot_state):
+    db, watcher = bot_state
+    bot = FakeBot(unreachable=[3])
+
+    replies = run_buy(["AbCd1234,", "EfGh5678", "IjKl9012", "ZzZz0000", "AbCd1234"], bot)
+
+    assert db.get_deal("AbCd1234").status == "payment_confirmed"
+    assert db.get_deal("EfGh5678").status == "payment_confirmed"
+    assert watcher.payment_status("AbCd1234") is True
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 2]
+    assert replies == [
+        "📋 Подтверждено 2 из 4 сделок:\n\n"
+        "✅ Оплата по сделке #AbCd1234 подтверждена.\n"
+        "✅ Оплата по сделке #EfGh5678 подтверждена (уведомления не доставлены).\n"
+        "⚠️ Сделка #IjKl9012 уже в статусе payment_confirmed.\n"
+        "❌ Сделка #ZzZz0000 не найдена.\n"
+    ]
+
+def test_buy_without_ids_shows_usage(bot_state):
+    db, _ = bot_state
+    replies = run_buy(["please", "confirm"], FakeBot())
+    assert replies == ["❌ Использование: /buy <deal_id> [deal_id ...]"]
+    assert db.get_deal("AbCd1234").status == "pending"
+
+def test_split_message_keeps_chunks_under_limit(monkeypatch):
+    monkeypatch.setattr(main, "MAX_MESSAGE_LENGTH", 20)
+    lines = ["first line", "second line", "third", "x" * 30]
+
+    chunks = main.split_message(lines)
+
+    assert "".join(chunks) == "".join(line + "\n" for line in lines)
+    assert chunks == ["first line\n", "second line\nthird\n", "x" * 30 + "\n"]
+    assert main.split_message([]) == []
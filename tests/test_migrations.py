@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+import migrations
+from migrations import Migration, backfill_in_batches, get_schema_version, migrate
+
+def test_migrate_is_noop_when_current(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    latest = migrate(db_path)
+    assert latest == migrations.MIGRATIONS[-1].version
+    assert migrate(db_path) == latest
+
+def test_interrupted_backfill_resumes_without_rerunning_schema(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    migrate(db_path)
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (user_id) VALUES (?)", [(i,) for i in range(1, 11)])
+    conn.commit()
+    conn.close()
+
+    seen = []
+    fail_after = {"batches": 2}
+
+    def schema(conn):
+        conn.execute("ALTER TABLE users ADD COLUMN score INTEGER")
+
+    def apply(conn, rows):
+        if fail_after["batches"] == 0:
+            raise RuntimeError("crash during backfill")
+        fail_after["batches"] -= 1
+        seen.extend(row[0] for row in rows)
+        conn.executemany("UPDATE users SET score = ? WHERE user_id = ?", [(row[0] * 10, row[0]) for row in rows])
+
+    def backfill(conn, version):
+        backfill_in_batches(
+            conn, version,
+            "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+            0, apply, batch_size=3
+        )
+
+    version = migrations.MIGRATIONS[-1].version + 1
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [Migration(version, schema, backfill)])
+
+    with pytest.raises(RuntimeError):
+        migrate(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert get_schema_version(conn) == version - 1
+    conn.close()
+
+    fail_after["batches"] = 100
+    assert migrate(db_path) == version
+
+    assert seen == list(range(1, 11))
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE score = user_id * 10").fetchone()[0] == 10
+    conn.close()
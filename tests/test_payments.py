@@ -0,0 +1,130 @@
+import os
+import json
+import asyncio
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from backup import BackupManager
+from database import Database
+from payments import (
+    PaymentProvider,
+    FilePaymentProvider,
+    PaymentWatcher,
+    parse_amount,
+)
+
+WALLET = "UQ-seller-wallet"
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    db.create_or_update_user(1, "seller")
+    db.create_deal("DEAL1", 1, "10", "gift", "TON", WALLET)
+    db.create_deal("DEAL2", 1, "5", "gift", "TON", WALLET)
+    return db
+
+def write_feed(path, *lines):
+    with open(path, "a") as f:
+        for line in lines:
+            f.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+
+def tx(tx_id, memo, amount, to=WALLET, currency="TON"):
+    return {"tx_id": tx_id, "memo": memo, "amount": amount, "to": to, "currency": currency}
+
+def make_watcher(db, feed):
+    watcher = PaymentWatcher(db, FilePaymentProvider(str(feed)))
+    watcher.load_index()
+    return watcher
+
+def test_parse_amount():
+    assert parse_amount("10,5") == Decimal("10.5")
+    assert parse_amount(" 1 000 ") == Decimal("1000")
+    assert parse_amount("abc") is None
+    assert parse_amount("0") is None
+    assert parse_amount("-3") is None
+    assert parse_amount("NaN") is None
+
+def test_provider_interface_is_abstract():
+    with pytest.raises(TypeError):
+        PaymentProvider()
+
+def test_poll_confirms_only_valid_payments(db, tmp_path):
+    feed = tmp_path / "feed.jsonl"
+    write_feed(
+        feed,
+        tx("1", "DEAL1", "9.99"),
+        tx("2", "DEAL1", "10", currency="RUB"),
+        tx("3", "DEAL1", "10", to="UQ-attacker-wallet"),
+        "{not json",
+        {"tx_id": "4", "memo": "DEAL2"},
+        tx("5", "DEAL2", "5"),
+        tx("6", "DEAL2", "50"),
+    )
+    watcher = make_watcher(db, feed)
+
+    confirmed = asyncio.run(watcher.poll())
+
+    assert confirmed == ["DEAL2"]
+    assert db.get_deal("DEAL1").status == "pending"
+    assert db.get_deal("DEAL2").status == "payment_confirmed"
+    assert watcher.payment_status("DEAL1") is False
+    assert watcher.payment_status("DEAL2") is True
+    assert watcher.payment_status("UNKNOWN") is None
+
+def test_partial_line_is_read_once_complete(db, tmp_path):
+    feed = tmp_path / "feed.jsonl"
+    with open(feed, "w") as f:
+        f.write(json.dumps(tx("1", "DEAL1", "10"))[:20])
+    watcher = make_watcher(db, feed)
+
+    assert asyncio.run(watcher.poll()) == []
+
+    with open(feed, "w") as f:
+        f.write(json.dumps(tx("1", "DEAL1", "10")) + "\n")
+    assert asyncio.run(watcher.poll()) == ["DEAL1"]
+
+def test_batch_is_replayed_when_confirmation_fails(db, tmp_path, monkeypatch):
+    feed = tmp_path / "feed.jsonl"
+    write_feed(feed, tx("1", "DEAL1", "10"))
+    watcher = make_watcher(db, feed)
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(db, "confirm_payments", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(watcher.poll())
+    monkeypatch.undo()
+
+    assert asyncio.run(watcher.poll()) == ["DEAL1"]
+    assert asyncio.run(watcher.poll()) == []
+
+def test_cursor_is_persisted_across_restarts(db, tmp_path):
+    feed = tmp_path / "feed.jsonl"
+    write_feed(feed, tx("1", "DEAL1", "10"))
+    assert asyncio.run(make_watcher(db, feed).poll()) == ["DEAL1"]
+
+    write_feed(feed, tx("2", "DEAL2", "5"))
+    restarted = make_watcher(db, feed)
+    assert asyncio.run(restarted.poll()) == ["DEAL2"]
+
+def test_payment_is_detected_again_after_restoring_older_snapshot(db, tmp_path):
+    feed = tmp_path / "feed.jsonl"
+    manager = BackupManager(db.db_path, backup_dir=str(tmp_path / "backups"))
+    watcher = make_watcher(db, feed)
+
+    snapshot = asyncio.run(manager.create_backup())
+
+    write_feed(feed, tx("1", "DEAL1", "10"))
+    assert asyncio.run(watcher.poll()) == ["DEAL1"]
+
+    asyncio.run(manager.restore(os.path.basename(snapshot.path)))
+    watcher.load_index()
+    assert db.get_deal("DEAL1").status == "pending"
+    assert watcher.payment_status("DEAL1") is False
+
+    assert asyncio.run(watcher.poll()) == ["DEAL1"]
+    assert db.get_deal("DEAL1").status == "payment_confirmed"
+    assert watcher.payment_status("DEAL1") is True
@@ -0,0 +1,85 @@
+import time
+import asyncio
+
+import pytest
+
+import ratelimit
+from ratelimit import AsyncRateLimiter, FloodControl, TokenBucket
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert all(bucket.try_consume() for _ in range(3))
+    assert not bucket.try_consume()
+    assert bucket.wait_time() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.try_consume()
+    assert not bucket.try_consume()
+
+    clock.now += 60
+    assert all(bucket.try_consume() for _ in range(3))
+    assert not bucket.try_consume()
+
+def test_flood_control_rejects_non_positive_rates():
+    with pytest.raises(ValueError):
+        FloodControl(user_rate=0, user_burst=5, global_rate=50, global_burst=100)
+    with pytest.raises(ValueError):
+        FloodControl(user_rate=1, user_burst=5, global_rate=0, global_burst=100)
+
+def test_flood_control_sheds_and_counts(clock):
+    flood = FloodControl(user_rate=1, user_burst=2, global_rate=1, global_burst=3)
+
+    assert flood.allow(1)
+    assert flood.allow(1)
+    assert not flood.allow(1)
+    assert flood.allow(2)
+    assert not flood.allow(2)
+    assert flood.stats() == {'passed': 3, 'shed_user': 1, 'shed_global': 1, 'tracked_users': 2}
+
+    # A globally shed update must not have used up user 2's token.
+    clock.now += 1
+    assert flood.allow(2)
+    assert flood.stats()['passed'] == 4
+
+def test_flood_control_evicts_least_recent_and_idle_users(clock):
+    flood = FloodControl(user_rate=1, user_burst=1, global_rate=1000, global_burst=1000,
+                         max_users=3, idle_timeout=60)
+
+    for user_id in range(1, 4):
+        assert flood.allow(user_id)
+        clock.now += 1
+    flood.allow(1)
+    assert flood.allow(4)
+    assert list(flood.users) == [3, 1, 4]
+
+    for user_id in range(5, 50):
+        flood.allow(user_id)
+        assert len(flood.users) <= flood.max_users
+
+    clock.now += 61
+    assert flood.allow(100)
+    assert list(flood.users) == [100]
+
+def test_paused_limiter_blocks_acquire_until_pause_ends():
+    limiter = AsyncRateLimiter(1000)
+
+    async def scenario():
+        limiter.pause(0.1)
+        started = time.monotonic()
+        await limiter.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.1
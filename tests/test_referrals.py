@@ -0,0 +1,29 @@
+import pytest
+
+from database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    db.create_or_update_user(1, "referrer")
+    return db
+
+def test_deal_between_two_referees_counts_once(db):
+    assert db.create_user_with_referral(2, "seller", 1)
+    assert db.create_user_with_referral(3, "buyer", 1)
+    db.create_deal("DEAL1", 2, "10", "gift", "TON", "wallet")
+    db.set_deal_buyer("DEAL1", 3)
+    db.confirm_payments(["DEAL1"])
+
+    assert db.complete_deal("DEAL1")
+    assert not db.complete_deal("DEAL1")
+
+    referrer = db.get_user(1)
+    assert referrer.referral_count == 2
+    assert referrer.referral_deals == 1
+
+def test_existing_user_and_self_referral_are_not_recorded(db):
+    assert not db.create_user_with_referral(1, "referrer", 1)
+    assert not db.create_user_with_referral(4, "new", 4)
+    assert not db.create_user_with_referral(5, "new", 999)
+    assert db.get_user(1).referral_count == 0